@@ -6,6 +6,10 @@ from aiogram.fsm.storage.memory import MemoryStorage
 
 from .database.engine import create_tables, AsyncSessionLocal
 from .handlers.user_commands import router as user_router
+from .services.gemini_service import llm_backend
+from .services.send_queue import outbound
+from .services.hook_writer import hook_writer
+from .services.personality_service import prune_all_personality_histories
 
 
 async def main():
@@ -38,18 +42,31 @@ async def main():
     await create_tables()
     print("✅ Database tables created successfully!")
     
+    # Trim personality histories left over from before versions were bounded
+    async with AsyncSessionLocal() as session:
+        pruned = await prune_all_personality_histories(session)
+    if pruned:
+        print(f"🧹 Removed {pruned} old personality versions")
+    
     # Get bot info
     bot_info = await bot.get_me()
     print(f"🤖 Bot started: @{bot_info.username}")
     print("📱 Bot is ready to receive messages...")
     print(f"💾 FSM storage initialized")
     
+    # Start outbound send queue
+    outbound.start()
+    
     # Start polling
     try:
         await dp.start_polling(bot)
     except Exception as e:
         print(f"❌ Error during polling: {e}")
         raise
+    finally:
+        await hook_writer.stop()
+        await outbound.stop()
+        await llm_backend.close()
 
 
 if __name__ == "__main__":
@@ -1,4 +1,5 @@
-from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncEngine, AsyncSession
 from .models import Base
 
 # Database URL for SQLite
@@ -11,6 +12,20 @@ engine = create_async_engine(
     future=True
 )
 
+
+def _casefold(value: str | None) -> str | None:
+    return value.casefold() if value is not None else None
+
+
+def register_sqlite_functions(async_engine: AsyncEngine) -> None:
+    """Add casefold() to SQLite connections: built-in lower()/LIKE only fold ASCII, not Cyrillic"""
+    @event.listens_for(async_engine.sync_engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        dbapi_connection.create_function("casefold", 1, _casefold, deterministic=True)
+
+
+register_sqlite_functions(engine)
+
 # Create async session maker
 AsyncSessionLocal = async_sessionmaker(
     engine,
@@ -19,10 +34,18 @@ AsyncSessionLocal = async_sessionmaker(
 )
 
 
+def _create_missing_indexes(sync_conn):
+    """create_all skips existing tables, so add indexes introduced later separately"""
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(sync_conn, checkfirst=True)
+
+
 async def create_tables():
     """Create all tables in the database"""
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(_create_missing_indexes)
 
 
 async def get_session():
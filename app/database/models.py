@@ -1,4 +1,4 @@
-from sqlalchemy import BigInteger, String, ForeignKey, func, TIMESTAMP, Text
+from sqlalchemy import BigInteger, String, ForeignKey, func, TIMESTAMP, Text, Index
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
 from datetime import datetime
 
@@ -51,9 +51,29 @@ class BotPersonality(Base):
         return f"BotPersonality(id={self.id}, user_id={self.user_id}, personality_prompt='{self.personality_prompt[:50] if self.personality_prompt else None}...')"
 
 
+class CurrentPersonality(Base):
+    """Pointer to the user's active bot personality version"""
+    __tablename__ = "current_personality"
+    
+    user_id: Mapped[int] = mapped_column(ForeignKey('users.user_id'), primary_key=True)
+    personality_id: Mapped[int | None] = mapped_column(ForeignKey('bot_personality.id'), nullable=True)
+    updated_at: Mapped[str] = mapped_column(
+        TIMESTAMP, 
+        server_default=func.now(),
+        onupdate=func.now(),
+        nullable=False
+    )
+    personality: Mapped["BotPersonality | None"] = relationship()
+    
+    def __repr__(self) -> str:
+        return f"CurrentPersonality(user_id={self.user_id}, personality_id={self.personality_id})"
+
+
 class Hook(Base):
     """Hook model for storing user memory facts"""
     __tablename__ = "hooks"
+    # Keyset pagination and per-user lookups go through (user_id, id)
+    __table_args__ = (Index("ix_hooks_user_id_id", "user_id", "id"),)
     
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     user_id: Mapped[int] = mapped_column(ForeignKey('users.user_id'))
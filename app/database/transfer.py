@@ -0,0 +1,248 @@
+import gzip
+import json
+import os
+from datetime import datetime
+
+from sqlalchemy import Table, select
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+
+from .engine import DATABASE_URL
+from .models import Base, User, Hook, BotPersonality, CurrentPersonality
+
+# Tables in dependency order: users must exist before their hooks/personalities
+TRANSFER_TABLES: list[tuple[str, Table]] = [
+    ("user", User.__table__),
+    ("hook", Hook.__table__),
+    ("personality", BotPersonality.__table__),
+    ("current_personality", CurrentPersonality.__table__),
+]
+
+DEFAULT_CHUNK_SIZE = 1000
+
+
+# --- Helper Functions ---
+def _key_column(table: Table):
+    """Single-column primary key used for keyset pagination"""
+    return list(table.primary_key.columns)[0]
+
+
+def _json_value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def _serialize_row(kind: str, row) -> str:
+    """Convert a table row to one JSONL line"""
+    data = {key: _json_value(value) for key, value in row._mapping.items()}
+    return json.dumps({"type": kind, "data": data}, ensure_ascii=False)
+
+
+def _deserialize_row(table: Table, data: dict) -> dict:
+    """Convert JSON values back to column values (timestamps are stored as ISO 8601)"""
+    values = {}
+    for column in table.columns:
+        if column.name not in data:
+            continue
+        value = data[column.name]
+        if isinstance(value, str) and column.type.python_type is datetime:
+            value = datetime.fromisoformat(value)
+        values[column.name] = value
+    return values
+
+
+def _state_path(path: str) -> str:
+    return path + ".state.json"
+
+
+def _load_state(path: str) -> dict:
+    try:
+        with open(_state_path(path), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def _save_state(path: str, state: dict) -> None:
+    """Atomically persist resume checkpoint next to the data file"""
+    tmp_path = _state_path(path) + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(tmp_path, _state_path(path))
+
+
+def _filter_key(user_ids: list[int] | None) -> list[int] | None:
+    return sorted(set(user_ids)) if user_ids else None
+
+
+def _check_resume_filter(state: dict, user_ids: list[int] | None) -> None:
+    """A checkpoint is only valid for the --user-id filter it was written with"""
+    if state and state.get("user_ids") != _filter_key(user_ids):
+        raise ValueError(
+            f"Checkpoint was written for user_ids={state.get('user_ids')}, "
+            f"cannot resume with user_ids={_filter_key(user_ids)}; start over without --resume"
+        )
+
+
+def _user_filter(table: Table, user_ids: list[int] | None):
+    column = table.c.user_id
+    return column.in_(user_ids) if user_ids else None
+
+
+def _open_jsonl(path: str, mode: str):
+    """Open plain or gzip-compressed JSONL for reading depending on file extension"""
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+def _encode_chunk(path: str, lines: list[str]) -> bytes:
+    """Encode one export chunk; for .gz every chunk is a complete gzip member"""
+    data = "".join(lines).encode("utf-8")
+    return gzip.compress(data) if path.endswith(".gz") else data
+
+
+def _make_engine(database_url: str | None) -> AsyncEngine:
+    return create_async_engine(database_url or DATABASE_URL, future=True)
+
+
+# --- Export ---
+async def export_memory(
+    path: str,
+    database_url: str | None = None,
+    user_ids: list[int] | None = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    resume: bool = False,
+) -> dict[str, int]:
+    """
+    Stream users, hooks and personalities to JSONL using keyset pagination.
+    Only one chunk is held in memory at a time. With resume=True the export
+    continues after the last checkpointed key instead of starting over; the
+    checkpoint must have been written with the same user_ids filter.
+    """
+    state = _load_state(path) if resume and os.path.exists(path) else {}
+    _check_resume_filter(state, user_ids)
+    state["user_ids"] = _filter_key(user_ids)
+    counts = state.get("counts") or {kind: 0 for kind, _ in TRANSFER_TABLES}
+    engine = _make_engine(database_url)
+    try:
+        with open(path, "r+b" if "offset" in state else "wb") as out:
+            # Drop whatever was written after the last checkpoint (possibly a cut-off gzip member)
+            out.truncate(state.get("offset", 0))
+            out.seek(0, os.SEEK_END)
+            for kind, table in TRANSFER_TABLES:
+                if state.get(kind, {}).get("done"):
+                    continue
+                key = _key_column(table)
+                last_key = state.get(kind, {}).get("last_key")
+                condition = _user_filter(table, user_ids)
+                while True:
+                    query = select(table).order_by(key).limit(chunk_size)
+                    if condition is not None:
+                        query = query.where(condition)
+                    if last_key is not None:
+                        query = query.where(key > last_key)
+                    async with engine.connect() as conn:
+                        rows = (await conn.execute(query)).all()
+                    if not rows:
+                        break
+                    out.write(_encode_chunk(path, [_serialize_row(kind, row) + "\n" for row in rows]))
+                    out.flush()
+                    os.fsync(out.fileno())
+                    last_key = rows[-1]._mapping[key.name]
+                    counts[kind] += len(rows)
+                    state[kind] = {"last_key": last_key, "done": False}
+                    state.update(offset=out.tell(), counts=counts)
+                    _save_state(path, state)
+                    print(f"📤 {kind}: {counts[kind]} (последний ключ {last_key})")
+                state[kind] = {"last_key": last_key, "done": True}
+                state.update(offset=out.tell(), counts=counts)
+                _save_state(path, state)
+    finally:
+        await engine.dispose()
+    os.remove(_state_path(path))
+    return counts
+
+
+# --- Import ---
+async def _insert_batch(engine: AsyncEngine, table: Table, batch: list[dict]) -> int:
+    """
+    Insert a batch with executemany. Rows already present with identical values
+    (e.g. committed before an interruption) are skipped; a different row under the
+    same primary key is a conflict and aborts the import instead of being dropped.
+    """
+    key = _key_column(table)
+    async with engine.begin() as conn:
+        existing = await conn.execute(
+            select(table).where(key.in_([values[key.name] for values in batch]))
+        )
+        existing_rows = {row._mapping[key.name]: row._mapping for row in existing}
+        new_rows = []
+        for values in batch:
+            current = existing_rows.get(values[key.name])
+            if current is None:
+                new_rows.append(values)
+                continue
+            if any(_json_value(current[name]) != _json_value(value) for name, value in values.items()):
+                raise ValueError(
+                    f"Conflict in {table.name}: {key.name}={values[key.name]} already exists with different data"
+                )
+        if new_rows:
+            await conn.execute(table.insert(), new_rows)
+    return len(new_rows)
+
+
+async def import_memory(
+    path: str,
+    database_url: str | None = None,
+    user_ids: list[int] | None = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    resume: bool = False,
+) -> dict[str, int]:
+    """
+    Stream JSONL records back into the database in batched transactions.
+    The file is read line by line, so memory stays bounded by chunk_size.
+    With resume=True already committed lines are skipped. Rows whose primary key
+    is taken by a different row raise ValueError.
+    """
+    tables = dict(TRANSFER_TABLES)
+    state = _load_state(path) if resume else {}
+    _check_resume_filter(state, user_ids)
+    skip_lines = state.get("lines_done", 0)
+    counts = state.get("counts") or {kind: 0 for kind in tables}
+    allowed_users = set(user_ids) if user_ids else None
+    engine = _make_engine(database_url)
+
+    async def flush(kind: str, batch: list[dict], lines_done: int) -> None:
+        counts[kind] += await _insert_batch(engine, tables[kind], batch)
+        _save_state(path, {"lines_done": lines_done, "counts": counts, "user_ids": _filter_key(user_ids)})
+        print(f"📥 {kind}: {counts[kind]} (строк обработано {lines_done})")
+
+    try:
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        batch_kind = None
+        batch: list[dict] = []
+        line_no = 0
+        with _open_jsonl(path, "r") as src:
+            for line_no, line in enumerate(src, start=1):
+                if line_no <= skip_lines or not line.strip():
+                    continue
+                record = json.loads(line)
+                kind = record["type"]
+                if kind not in tables:
+                    raise ValueError(f"Unknown record type '{kind}' at line {line_no}")
+                values = _deserialize_row(tables[kind], record["data"])
+                if allowed_users is not None and values.get("user_id") not in allowed_users:
+                    continue
+                # Records are grouped by table, so a kind switch closes the batch
+                if batch and (kind != batch_kind or len(batch) >= chunk_size):
+                    await flush(batch_kind, batch, line_no - 1)
+                    batch = []
+                batch_kind = kind
+                batch.append(values)
+        if batch:
+            await flush(batch_kind, batch, line_no)
+    finally:
+        await engine.dispose()
+    if os.path.exists(_state_path(path)):
+        os.remove(_state_path(path))
+    return counts
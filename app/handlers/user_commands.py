@@ -1,5 +1,5 @@
 from aiogram import Router, F
-from aiogram.filters import Command
+from aiogram.filters import Command, CommandObject
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
@@ -8,9 +8,15 @@ from sqlalchemy import select
 from sqlalchemy.orm import selectinload
 from datetime import datetime, timezone
 import json
+import hashlib
 
-from app.database.models import User, Hook, BotPersonality
-from app.services.gemini_service import analyze_and_manage_hooks, generate_assistant_reply, model
+from app.database.models import User, Hook
+from app.services.gemini_service import analyze_and_manage_hooks, generate_assistant_reply, model, llm_backend
+from app.services.personality_service import get_bot_personality, set_bot_personality
+from app.services.hook_service import get_active_hooks, get_hooks_page
+from app.services.telegram_limits import TELEGRAM_MESSAGE_LIMIT
+from app.services.send_queue import outbound, send_message, edit_message, PRIORITY_REPLY
+from app.services.hook_writer import hook_writer, HookOp
 import google.generativeai as genai
 
 router = Router()
@@ -47,17 +53,6 @@ def convert_google_api_object(obj):
     else:
         return obj
 
-async def get_bot_personality(session: AsyncSession, user_id: int) -> str | None:
-    """Get current bot personality for a user"""
-    result = await session.execute(
-        select(BotPersonality)
-        .where(BotPersonality.user_id == user_id)
-        .order_by(BotPersonality.id.desc())
-        .limit(1)
-    )
-    personality = result.scalar_one_or_none()
-    return personality.personality_prompt if personality else None
-
 # === Глобальное хранилище истории чата ===
 chat_histories = {}
 
@@ -91,11 +86,11 @@ async def cmd_start(message: Message, session: AsyncSession):
         
         # Send welcome message
         welcome_text = f"Привет, {first_name}! Я бот с продвинутой системой памяти. Рад нашему знакомству!"
-        await message.answer(welcome_text)
+        await send_message(message, welcome_text)
     
     except Exception as e:
         print(f"❌ Ошибка в команде /start: {e}")
-        await message.answer("Произошла ошибка при обработке команды. Попробуйте позже.")
+        await send_message(message, "Произошла ошибка при обработке команды. Попробуйте позже.")
 
 # --- FSM Message Handler for Personality Editing ---
 @router.message(PersonalityStates.waiting_for_new_personality)
@@ -103,12 +98,10 @@ async def handle_new_personality(message: Message, session: AsyncSession, state:
     """Handle new personality input"""
     new_personality = message.text
     user_id = message.from_user.id
-    # Create new personality record for this user
-    new_personality_record = BotPersonality(user_id=user_id, personality_prompt=new_personality)
-    session.add(new_personality_record)
-    await session.commit()
+    # Save new personality version for this user
+    await set_bot_personality(session, user_id, new_personality)
     await state.clear()
-    await message.answer(f"✅ Личность бота обновлена индивидуально для вас:\n\n{new_personality}")
+    await send_message(message, f"✅ Личность бота обновлена индивидуально для вас:\n\n{new_personality}")
     return
 
 # --- General Message Handler ---
@@ -145,16 +138,11 @@ async def handle_message(
         session.add(user)
         await session.commit()
     
-    # Get user's hooks (excluding expired ones)
-    result = await session.execute(
-        select(Hook)
-        .where(Hook.user_id == user_id)
-        .where(
-            (Hook.expires_at.is_(None)) | 
-            (Hook.expires_at > datetime.now(timezone.utc))
-        )
-    )
-    existing_hooks = [hook.text for hook in result.scalars().all()]
+    # Get user's hooks (excluding expired ones), including changes not yet flushed;
+    # the snapshot is taken before the read so a concurrent flush cannot hide a diff
+    pending_hooks = hook_writer.snapshot(user_id)
+    stored_hooks = [hook.text for hook in await get_active_hooks(session, user_id)]
+    existing_hooks = hook_writer.overlay(user_id, stored_hooks, pending_hooks)
     
     # Get bot personality индивидуально
     personality_prompt = await get_bot_personality(session, user_id)
@@ -172,6 +160,8 @@ async def handle_message(
             args = convert_google_api_object(function_call.args)
             print(f"[FUNCTION CALL ARGS]: {json.dumps(args, ensure_ascii=False, indent=2)}")
             
+            ops = []
+            
             # Process hooks_to_add
             if 'hooks_to_add' in args:
                 for hook_data in args['hooks_to_add']:
@@ -184,12 +174,7 @@ async def handle_message(
                     
                     if text:
                         expires_at = parse_expires_at(expires_at_str)
-                        new_hook = Hook(
-                            user_id=user_id,
-                            text=text,
-                            expires_at=expires_at
-                        )
-                        session.add(new_hook)
+                        ops.append(HookOp('add', text, expires_at=expires_at))
                         print(f"[ADDED HOOK]: {text} (expires: {expires_at})")
             
             # Process hooks_to_update
@@ -200,38 +185,22 @@ async def handle_message(
                     expires_at_str = update_data.get('expires_at')
                     
                     if old_text and new_text:
-                        result = await session.execute(
-                            select(Hook).where(
-                                Hook.user_id == user_id,
-                                Hook.text == old_text
-                            )
-                        )
-                        hook = result.scalar_one_or_none()
-                        if hook:
-                            hook.text = new_text
-                            hook.expires_at = parse_expires_at(expires_at_str)
-                            print(f"[UPDATED HOOK]: {old_text} -> {new_text}")
+                        ops.append(HookOp('update', old_text, new_text, parse_expires_at(expires_at_str)))
+                        print(f"[UPDATED HOOK]: {old_text} -> {new_text}")
             
             # Process hooks_to_delete
             if 'hooks_to_delete' in args:
                 for text_to_delete in args['hooks_to_delete']:
-                    result = await session.execute(
-                        select(Hook).where(
-                            Hook.user_id == user_id,
-                            Hook.text == text_to_delete
-                        )
-                    )
-                    hook = result.scalar_one_or_none()
-                    if hook:
-                        await session.delete(hook)
-                        print(f"[DELETED HOOK]: {text_to_delete}")
+                    ops.append(HookOp('delete', text_to_delete))
+                    print(f"[DELETED HOOK]: {text_to_delete}")
             
-            await session.commit()
-            print(f"✅ Database updated successfully for user {user_id}")
+            # Write-behind: committed together with other users' changes
+            if ops:
+                hook_writer.submit(user_id, ops)
+                print(f"✅ Hook changes queued for user {user_id}")
             
         except Exception as e:
             print(f"❌ Error processing function call: {e}")
-            await session.rollback()
     
     # Generate and send response
     response_text = await generate_assistant_reply(
@@ -246,7 +215,7 @@ async def handle_message(
         'text': response_text
     })
     chat_histories[user_id] = chat_histories[user_id][-20:]
-    await message.answer(response_text)
+    await send_message(message, response_text, priority=PRIORITY_REPLY)
 
 # --- /clean Command Handler ---
 @router.message(Command("clean"))
@@ -255,37 +224,97 @@ async def clean_chat_history(message: Message):
     user_id = message.from_user.id
     if user_id in chat_histories:
         chat_histories[user_id] = []
-    await message.answer("✅ История чата очищена. Начинаем новый диалог!")
+    await send_message(message, "✅ История чата очищена. Начинаем новый диалог!")
 
 # --- /hooks Command Handler ---
+HOOKS_FOOTER = "\n💡 Для изменения или удаления фактов просто напишите об этом в чате."
+
+# Search terms do not fit into 64-byte callback data, so buttons carry a short key
+hook_searches: dict[str, str] = {}
+
+def hook_search_key(search: str | None) -> str:
+    """Short stable key of a search term for callback data ('' = no search)"""
+    if not search:
+        return ""
+    key = hashlib.sha1(search.encode("utf-8")).hexdigest()[:10]
+    hook_searches.pop(key, None)
+    hook_searches[key] = search
+    if len(hook_searches) > 1000:
+        hook_searches.pop(next(iter(hook_searches)))
+    return key
+
+def render_hooks_page(
+    hooks: list[Hook],
+    has_prev: bool,
+    has_next: bool,
+    backwards: bool,
+    search: str | None
+) -> tuple[str, InlineKeyboardMarkup | None]:
+    """Build page text within Telegram's message limit and its navigation keyboard"""
+    header = "📝 Ваши сохранённые факты"
+    header += f" (поиск: «{search}»):\n\n" if search else ":\n\n"
+    budget = TELEGRAM_MESSAGE_LIMIT - len(header) - len(HOOKS_FOOTER)
+    lines = [format_hook_with_expiry(hook)[:budget - 1] for hook in hooks]
+    # Drop hooks that do not fit; going back we keep the ones next to the previous page
+    shown = list(range(len(hooks)))
+    while sum(len(lines[i]) + 1 for i in shown) > budget:
+        if backwards:
+            shown.pop(0)
+            has_prev = True
+        else:
+            shown.pop()
+            has_next = True
+    text = header + "".join(lines[i] + "\n" for i in shown) + HOOKS_FOOTER
+    search_key = hook_search_key(search)
+    buttons = []
+    if has_prev:
+        buttons.append(InlineKeyboardButton(text="⬅️ Назад", callback_data=f"hooks:prev:{hooks[shown[0]].id}:{search_key}"))
+    if has_next:
+        buttons.append(InlineKeyboardButton(text="Вперёд ➡️", callback_data=f"hooks:next:{hooks[shown[-1]].id}:{search_key}"))
+    keyboard = InlineKeyboardMarkup(inline_keyboard=[buttons]) if buttons else None
+    return text, keyboard
+
 @router.message(Command("hooks"))
-async def show_hooks(message: Message, session: AsyncSession):
-    """Show user's non-expired hooks"""
+async def show_hooks(message: Message, session: AsyncSession, command: CommandObject):
+    """Show first page of user's non-expired hooks, optionally filtered by search text"""
     user_id = message.from_user.id
+    search = command.args.strip() if command.args else None
     
-    # Get non-expired hooks
-    result = await session.execute(
-        select(Hook)
-        .where(Hook.user_id == user_id)
-        .where(
-            (Hook.expires_at.is_(None)) | 
-            (Hook.expires_at > datetime.now(timezone.utc))
-        )
-    )
-    hooks = result.scalars().all()
+    hooks, has_prev, has_next = await get_hooks_page(session, user_id, search=search)
     
     if not hooks:
-        await message.answer("📝 У вас пока нет сохранённых фактов. Я буду запоминать информацию о вас в процессе общения.")
+        if search:
+            await send_message(message, f"🔍 Не найдено фактов по запросу «{search}».")
+        else:
+            await send_message(message, "📝 У вас пока нет сохранённых фактов. Я буду запоминать информацию о вас в процессе общения.")
         return
     
-    # Format hooks list
-    hooks_text = "📝 Ваши сохранённые факты:\n\n"
-    for hook in hooks:
-        hooks_text += format_hook_with_expiry(hook) + "\n"
-    
-    hooks_text += "\n💡 Для изменения или удаления фактов просто напишите об этом в чате."
-    
-    await message.answer(hooks_text)
+    text, keyboard = render_hooks_page(hooks, has_prev, has_next, False, search)
+    await send_message(message, text, reply_markup=keyboard)
+
+@router.callback_query(F.data.startswith("hooks:"))
+async def hooks_page_callback(callback: CallbackQuery, session: AsyncSession):
+    """Fetch one neighbouring page of hooks, with the search bound to this message's buttons"""
+    _, direction, cursor, search_key = callback.data.split(":")
+    user_id = callback.from_user.id
+    search = hook_searches.get(search_key) if search_key else None
+    if search_key and search is None:
+        await callback.answer("Поиск устарел, повторите команду /hooks.")
+        return
+    backwards = direction == "prev"
+    hooks, has_prev, has_next = await get_hooks_page(
+        session,
+        user_id,
+        after_id=None if backwards else int(cursor),
+        before_id=int(cursor) if backwards else None,
+        search=search
+    )
+    if not hooks:
+        await callback.answer("Больше фактов нет.")
+        return
+    text, keyboard = render_hooks_page(hooks, has_prev, has_next, backwards, search)
+    await edit_message(callback.message, text, reply_markup=keyboard)
+    await callback.answer()
 
 # --- /personality Command Handler ---
 @router.message(Command("personality"))
@@ -308,22 +337,20 @@ async def show_personality(message: Message, session: AsyncSession):
         ]
     )
     
-    await message.answer(personality_text, reply_markup=keyboard)
+    await send_message(message, personality_text, reply_markup=keyboard)
 
 # --- Callback Handlers ---
 @router.callback_query(F.data == "clear_personality")
 async def clear_personality_callback(callback: CallbackQuery, session: AsyncSession):
     """Clear bot's personality for this user"""
     user_id = callback.from_user.id
-    new_personality = BotPersonality(user_id=user_id, personality_prompt=None)
-    session.add(new_personality)
-    await session.commit()
-    await callback.message.edit_text("✅ Ваша индивидуальная личность бота очищена.")
+    await set_bot_personality(session, user_id, None)
+    await edit_message(callback.message, "✅ Ваша индивидуальная личность бота очищена.")
 
 @router.callback_query(F.data == "edit_personality")
 async def edit_personality_callback(callback: CallbackQuery, state: FSMContext):
     await state.set_state(PersonalityStates.waiting_for_new_personality)
-    await callback.message.edit_text("✍️ Напишите новую индивидуальную личность для бота. Например:\n\n• 'Я дружелюбный и веселый ассистент'\n• 'Я строгий и профессиональный консультант'\n• 'Я творческий и креативный помощник'")
+    await edit_message(callback.message, "✍️ Напишите новую индивидуальную личность для бота. Например:\n\n• 'Я дружелюбный и веселый ассистент'\n• 'Я строгий и профессиональный консультант'\n• 'Я творческий и креативный помощник'")
 
 @router.message(Command("debug"))
 async def debug_info(message: Message, session: AsyncSession):
@@ -338,15 +365,9 @@ async def debug_info(message: Message, session: AsyncSession):
         elif msg['role'] == 'assistant':
             history_text += f"Ассистент: {msg['text']}\n"
     # Факты
-    result = await session.execute(
-        select(Hook)
-        .where(Hook.user_id == user_id)
-        .where(
-            (Hook.expires_at.is_(None)) | 
-            (Hook.expires_at > datetime.now(timezone.utc))
-        )
-    )
-    existing_hooks = [hook.text for hook in result.scalars().all()]
+    pending_hooks = hook_writer.snapshot(user_id)
+    stored_hooks = [hook.text for hook in await get_active_hooks(session, user_id)]
+    existing_hooks = hook_writer.overlay(user_id, stored_hooks, pending_hooks)
     # Личность
     personality_prompt = await get_bot_personality(session, user_id)
     # Формируем полный prompt как в generate_assistant_reply
@@ -386,7 +407,18 @@ async def debug_info(message: Message, session: AsyncSession):
         debug_text += f"Точное число токенов (Gemini): {real_tokens}\n"
     else:
         debug_text += f"Оценка токенов: {approx_tokens}\n"
-    await message.answer(debug_text)
+    # Очередь исходящих сообщений
+    queue_metrics = outbound.metrics()
+    debug_text += f"Очередь отправки: {queue_metrics['queue_depth']} (отправлено {queue_metrics['sent']}, RetryAfter {queue_metrics['retry_after']})\n"
+    if queue_metrics['send_p95'] is not None:
+        debug_text += f"Отправка p95: {queue_metrics['send_p95']:.2f} с, с учётом очереди: {queue_metrics['queue_p95']:.2f} с\n"
+    debug_text += f"Хуков в очереди записи: {hook_writer.pending_count()}\n"
+    # Задержки LLM-бэкендов
+    for backend in llm_backend.backends():
+        p95 = backend.latency.percentile(0.95)
+        if p95 is not None:
+            debug_text += f"LLM {backend.name}: p95 {p95:.2f} с ({len(backend.latency)} запросов)\n"
+    await send_message(message, debug_text)
 
 @router.message(Command("help"))
 async def help_command(message: Message):
@@ -394,9 +426,9 @@ async def help_command(message: Message):
     help_text = (
         "/start - Начать работу с ботом, регистрация пользователя\n"
         "/clean - Очистить историю чата (бот забудет весь предыдущий диалог)\n"
-        "/hooks - Показать все факты, которые бот запомнил о вас\n"
+        "/hooks [поиск] - Показать факты, которые бот запомнил о вас (постранично, с поиском)\n"
         "/personality - Показать или изменить вашу индивидуальную личность бота\n"
         "/debug - Показать отладочную информацию (история, факты, длина prompt, токены)\n"
         "/help - Краткая справка по возможностям бота\n"
     )
-    await message.answer(help_text) 
\ No newline at end of file
+    await send_message(message, help_text) 
\ No newline at end of file
@@ -2,72 +2,136 @@ import os
 from dotenv import load_dotenv
 load_dotenv()
 import google.generativeai as genai
-from google.generativeai.types import GenerationConfig, Tool
+from google.generativeai.types import Tool
 import json
 from datetime import datetime, timezone
 
+from app.services.llm_backends import LLMBackend, GeminiBackend, OpenAICompatibleBackend, HedgedBackend
+
 # --- Gemini API Configuration ---
 api_key = os.getenv('GEMINI_API_KEY') or os.getenv('GOOGLE_API_KEY')
-if not api_key:
-    raise ValueError("GEMINI_API_KEY or GOOGLE_API_KEY not found in environment variables")
-
-genai.configure(api_key=api_key)
-print(f"🔑 Gemini API key configured successfully")
+if api_key:
+    genai.configure(api_key=api_key)
+    print(f"🔑 Gemini API key configured successfully")
 
 # Get model name from environment
 MODEL_NAME = os.getenv('GEMINI_MODEL_NAME', 'gemini-1.5-flash-latest')
 print(f"🤖 Using Gemini model: {MODEL_NAME}")
 
 # --- Tool Definition for Function Calling ---
-MANAGE_HOOKS_TOOL = Tool(
-    function_declarations=[
-        {
-            "name": "manage_user_memory_hooks",
-            "description": "Добавляет, обновляет или удаляет факты (хуки) о пользователе на основе анализа сообщения. Используется для поддержания актуальной информации о пользователе. Если пользователь выражает пожелания к стилю общения (например, 'пиши покороче', 'можно на ты', 'отвечай сухо'), запоминай это как отдельный хук. Извлекай не только факты, но и события, перемены, отношения, эмоции, если они важны для понимания пользователя (например, 'кот переехал к родителям', 'я начал заниматься HTML', 'я стал чаще гулять'). Даже если сообщение выглядит как общий вопрос или не содержит явных фактов, старайся извлекать косвенные признаки интересов, увлечений, предпочтений пользователя (например, если пользователь спрашивает про дистрибутивы Linux — это может говорить о его интересе к операционным системам и Linux). Для временных фактов (например, 'еду в отпуск на неделю', 'болею до пятницы') предлагай expires_at в формате ISO 8601 (YYYY-MM-DDTHH:MM:SSZ).",
-            "parameters": {
-                "type": "OBJECT",
-                "properties": {
-                    "hooks_to_add": {
-                        "type": "ARRAY",
-                        "items": {
-                            "type": "OBJECT",
-                            "properties": {
-                                "text": {"type": "STRING"},
-                                "expires_at": {"type": "STRING", "description": "Время истечения в формате ISO 8601 (YYYY-MM-DDTHH:MM:SSZ), если факт временный"}
-                            },
-                            "required": ["text"]
-                        },
-                        "description": "Список новых фактов о пользователе, которые нужно запомнить. Включай сюда и пожелания к стилю общения, и любые события, перемены, отношения, эмоции, а также косвенные признаки интересов, увлечений, предпочтений."
+MANAGE_HOOKS_DECLARATION = {
+    "name": "manage_user_memory_hooks",
+    "description": "Добавляет, обновляет или удаляет факты (хуки) о пользователе на основе анализа сообщения. Используется для поддержания актуальной информации о пользователе. Если пользователь выражает пожелания к стилю общения (например, 'пиши покороче', 'можно на ты', 'отвечай сухо'), запоминай это как отдельный хук. Извлекай не только факты, но и события, перемены, отношения, эмоции, если они важны для понимания пользователя (например, 'кот переехал к родителям', 'я начал заниматься HTML', 'я стал чаще гулять'). Даже если сообщение выглядит как общий вопрос или не содержит явных фактов, старайся извлекать косвенные признаки интересов, увлечений, предпочтений пользователя (например, если пользователь спрашивает про дистрибутивы Linux — это может говорить о его интересе к операционным системам и Linux). Для временных фактов (например, 'еду в отпуск на неделю', 'болею до пятницы') предлагай expires_at в формате ISO 8601 (YYYY-MM-DDTHH:MM:SSZ).",
+    "parameters": {
+        "type": "OBJECT",
+        "properties": {
+            "hooks_to_add": {
+                "type": "ARRAY",
+                "items": {
+                    "type": "OBJECT",
+                    "properties": {
+                        "text": {"type": "STRING"},
+                        "expires_at": {"type": "STRING", "description": "Время истечения в формате ISO 8601 (YYYY-MM-DDTHH:MM:SSZ), если факт временный"}
                     },
-                    "hooks_to_update": {
-                        "type": "ARRAY",
-                        "items": {
-                            "type": "OBJECT",
-                            "properties": {
-                                "old_hook_text": {"type": "STRING"},
-                                "new_hook_text": {"type": "STRING"},
-                                "expires_at": {"type": "STRING", "description": "Время истечения в формате ISO 8601 (YYYY-MM-DDTHH:MM:SSZ), если факт временный"}
-                            },
-                            "required": ["old_hook_text", "new_hook_text"]
-                        },
-                        "description": "Список фактов для обновления. Указывает старый текст и новый текст."
+                    "required": ["text"]
+                },
+                "description": "Список новых фактов о пользователе, которые нужно запомнить. Включай сюда и пожелания к стилю общения, и любые события, перемены, отношения, эмоции, а также косвенные признаки интересов, увлечений, предпочтений."
+            },
+            "hooks_to_update": {
+                "type": "ARRAY",
+                "items": {
+                    "type": "OBJECT",
+                    "properties": {
+                        "old_hook_text": {"type": "STRING"},
+                        "new_hook_text": {"type": "STRING"},
+                        "expires_at": {"type": "STRING", "description": "Время истечения в формате ISO 8601 (YYYY-MM-DDTHH:MM:SSZ), если факт временный"}
                     },
-                    "hooks_to_delete": {
-                        "type": "ARRAY",
-                        "items": {"type": "STRING"},
-                        "description": "Список фактов, которые стали неактуальны и их нужно удалить."
-                    }
-                }
+                    "required": ["old_hook_text", "new_hook_text"]
+                },
+                "description": "Список фактов для обновления. Указывает старый текст и новый текст."
+            },
+            "hooks_to_delete": {
+                "type": "ARRAY",
+                "items": {"type": "STRING"},
+                "description": "Список фактов, которые стали неактуальны и их нужно удалить."
             }
         }
-    ]
-)
+    }
+}
+
+MANAGE_HOOKS_TOOL = Tool(function_declarations=[MANAGE_HOOKS_DECLARATION])
 
 # --- Gemini Model Initialization ---
 model = genai.GenerativeModel(
     model_name=MODEL_NAME,
     tools=[MANAGE_HOOKS_TOOL]
 )
+model_no_tools = genai.GenerativeModel(
+    model_name=MODEL_NAME,
+    tools=[]
+)
+
+# --- LLM Backend Selection ---
+def build_backend(kind: str, prefix: str = '', name: str | None = None) -> LLMBackend:
+    """
+    Create a backend by kind: 'gemini' or 'openai' (any OpenAI-compatible endpoint).
+    Settings are read from environment variables with the given prefix, so the
+    backup backend (prefix 'LLM_BACKUP_') has its own model and endpoint.
+    """
+    name = name or kind
+    if kind == 'gemini':
+        if not api_key:
+            raise ValueError("GEMINI_API_KEY or GOOGLE_API_KEY not found in environment variables")
+        model_name = os.getenv(f'{prefix}GEMINI_MODEL_NAME', MODEL_NAME)
+        if model_name == MODEL_NAME:
+            return GeminiBackend(name, model, model_no_tools)
+        return GeminiBackend(
+            name,
+            genai.GenerativeModel(model_name=model_name, tools=[MANAGE_HOOKS_TOOL]),
+            genai.GenerativeModel(model_name=model_name, tools=[])
+        )
+    if kind == 'openai':
+        base_url = os.getenv(f'{prefix}OPENAI_BASE_URL')
+        if not base_url:
+            raise ValueError(f"{prefix}OPENAI_BASE_URL not found in environment variables")
+        return OpenAICompatibleBackend(
+            name,
+            base_url=base_url,
+            model_name=os.getenv(f'{prefix}OPENAI_MODEL_NAME', 'gpt-4o-mini'),
+            api_key=os.getenv(f'{prefix}OPENAI_API_KEY'),
+            function_declarations=[MANAGE_HOOKS_DECLARATION],
+            timeout=float(os.getenv(f'{prefix}OPENAI_TIMEOUT', '60')),
+        )
+    raise ValueError(f"Unknown LLM backend: {kind}")
+
+
+def _backend_target(backend: LLMBackend):
+    """What a backend actually calls, to refuse hedging a backend against itself"""
+    if isinstance(backend, OpenAICompatibleBackend):
+        return ('openai', backend.url, backend.model_name)
+    if isinstance(backend, GeminiBackend):
+        return ('gemini', backend.model.model_name)
+    return (backend.name,)
+
+
+def build_backend_from_env() -> LLMBackend:
+    """LLM_BACKEND selects the primary backend; LLM_BACKUP_BACKEND enables hedged requests"""
+    primary = build_backend(os.getenv('LLM_BACKEND', 'gemini'))
+    backup_kind = os.getenv('LLM_BACKUP_BACKEND')
+    if not backup_kind:
+        return primary
+    backup = build_backend(backup_kind, prefix='LLM_BACKUP_', name=f"backup-{backup_kind}")
+    if _backend_target(backup) == _backend_target(primary):
+        raise ValueError("LLM backup backend points to the same model/endpoint as the primary one")
+    return HedgedBackend(
+        primary,
+        backup,
+        default_delay=float(os.getenv('LLM_HEDGE_DELAY', '2.0')),
+    )
+
+
+llm_backend = build_backend_from_env()
+print(f"🔀 LLM backend: {llm_backend.name}")
 
 # --- Main Analysis Function ---
 async def analyze_and_manage_hooks(message_text: str, existing_hooks: list[str], chat_session=None, personality_prompt: str | None = None):
@@ -95,19 +159,17 @@ async def analyze_and_manage_hooks(message_text: str, existing_hooks: list[str],
     print("\n===== [Gemini Memory Function Calling] =====")
     print(f"[PROMPT]:\n{system_prompt}\n\n[USER]: {message_text}")
     try:
-        response = await model.generate_content_async(
+        result = await llm_backend.generate(
             system_prompt + "\n\nНовое сообщение от пользователя: " + message_text,
-            generation_config=GenerationConfig(temperature=0.3)
+            temperature=0.3
         )
-        print("[RAW RESPONSE]:\n" + json.dumps(response.to_dict() if hasattr(response, 'to_dict') else str(response), ensure_ascii=False, indent=2))
-        if response.candidates and response.candidates[0].content.parts:
-            part = response.candidates[0].content.parts[0]
-            if hasattr(part, 'function_call') and part.function_call:
-                print(f"[FOUND FUNCTION CALL]: {part.function_call}")
-                return part.function_call
+        print(f"[RAW RESPONSE ({result.backend})]:\n" + json.dumps(result.raw, ensure_ascii=False, indent=2, default=str))
+        if result.function_call:
+            print(f"[FOUND FUNCTION CALL]: {result.function_call}")
+            return result.function_call
         print("[NO FUNCTION CALL FOUND]")
     except Exception as e:
-        print(f"❌ Error during Gemini API call: {e}")
+        print(f"❌ Error during LLM API call: {e}")
         return None
     
     return None
@@ -143,52 +205,22 @@ async def generate_assistant_reply(message_text: str, existing_hooks: list[str],
     print("\n===== [Gemini Assistant Reply] =====")
     print(f"[PROMPT]:\n{system_prompt}\n\n[USER]: {message_text}")
     try:
-        response = await model.generate_content_async(
-            system_prompt + "\n\nСообщение пользователя: " + message_text,
-            generation_config=GenerationConfig(temperature=0.7)
-        )
-        print("[RAW RESPONSE]:\n" + json.dumps(response.to_dict() if hasattr(response, 'to_dict') else str(response), ensure_ascii=False, indent=2))
-        # 1. Пробуем response.text
-        if hasattr(response, "text") and response.text:
-            print(f"[FOUND TEXT]: {response.text.strip()}")
-            return response.text.strip()
-        # 2. Пробуем candidates[0].content.parts
-        if hasattr(response, "candidates") and response.candidates:
-            parts = getattr(response.candidates[0].content, "parts", None)
-            if parts:
-                for part in parts:
-                    if hasattr(part, "text") and part.text:
-                        print(f"[FOUND PART TEXT]: {part.text.strip()}")
-                        return part.text.strip()
-        # 3. Если есть function_call, но нет текста — делаем повторный запрос без tools
-        if hasattr(response, "candidates") and response.candidates:
-            parts = getattr(response.candidates[0].content, "parts", None)
-            if parts:
-                for part in parts:
-                    if hasattr(part, "function_call") and part.function_call:
-                        print("[ONLY FUNCTION CALL FOUND, RETRYING WITHOUT TOOLS]")
-                        # Повторный запрос без tools
-                        model_no_tools = genai.GenerativeModel(
-                            model_name=MODEL_NAME,
-                            tools=[]
-                        )
-                        response2 = await model_no_tools.generate_content_async(
-                            system_prompt + "\n\nСообщение пользователя: " + message_text,
-                            generation_config=GenerationConfig(temperature=0.7)
-                        )
-                        print("[RAW RESPONSE 2]:\n" + json.dumps(response2.to_dict() if hasattr(response2, 'to_dict') else str(response2), ensure_ascii=False, indent=2))
-                        if hasattr(response2, "text") and response2.text:
-                            print(f"[FOUND TEXT 2]: {response2.text.strip()}")
-                            return response2.text.strip()
-                        if hasattr(response2, "candidates") and response2.candidates:
-                            parts2 = getattr(response2.candidates[0].content, "parts", None)
-                            if parts2:
-                                for part2 in parts2:
-                                    if hasattr(part2, "text") and part2.text:
-                                        print(f"[FOUND PART TEXT 2]: {part2.text.strip()}")
-                                        return part2.text.strip()
+        prompt = system_prompt + "\n\nСообщение пользователя: " + message_text
+        result = await llm_backend.generate(prompt, temperature=0.7)
+        print(f"[RAW RESPONSE ({result.backend})]:\n" + json.dumps(result.raw, ensure_ascii=False, indent=2, default=str))
+        if result.text:
+            print(f"[FOUND TEXT]: {result.text}")
+            return result.text
+        # Если есть function_call, но нет текста — делаем повторный запрос без tools
+        if result.function_call:
+            print("[ONLY FUNCTION CALL FOUND, RETRYING WITHOUT TOOLS]")
+            result2 = await llm_backend.generate(prompt, temperature=0.7, use_tools=False)
+            print(f"[RAW RESPONSE 2 ({result2.backend})]:\n" + json.dumps(result2.raw, ensure_ascii=False, indent=2, default=str))
+            if result2.text:
+                print(f"[FOUND TEXT 2]: {result2.text}")
+                return result2.text
         print("[NO TEXT FOUND]")
         return "[Не удалось сгенерировать ответ.]"
     except Exception as e:
-        print(f"❌ Error during Gemini assistant reply: {e}")
+        print(f"❌ Error during LLM assistant reply: {e}")
         return "[Внутренняя ошибка бота. Попробуйте позже или обратитесь к администратору.]" 
\ No newline at end of file
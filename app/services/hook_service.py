@@ -0,0 +1,61 @@
+from datetime import datetime, timezone
+from sqlalchemy import select, Select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database.models import Hook
+
+# How many hooks to fetch per /hooks page
+HOOKS_PAGE_SIZE = 20
+
+
+def active_hooks_query(user_id: int, search: str | None = None) -> Select:
+    """Base query for user's non-expired hooks, shared by the message pipeline and /hooks"""
+    query = (
+        select(Hook)
+        .where(Hook.user_id == user_id)
+        .where(
+            (Hook.expires_at.is_(None)) |
+            (Hook.expires_at > datetime.now(timezone.utc))
+        )
+    )
+    if search:
+        # Unicode-aware case-insensitive substring match (casefold is registered in engine.py)
+        query = query.where(func.instr(func.casefold(Hook.text), search.casefold()) > 0)
+    return query
+
+
+async def get_active_hooks(session: AsyncSession, user_id: int) -> list[Hook]:
+    """Get all non-expired hooks of a user"""
+    result = await session.execute(active_hooks_query(user_id).order_by(Hook.id))
+    return list(result.scalars().all())
+
+
+async def get_hooks_page(
+    session: AsyncSession,
+    user_id: int,
+    after_id: int | None = None,
+    before_id: int | None = None,
+    search: str | None = None,
+    limit: int = HOOKS_PAGE_SIZE,
+) -> tuple[list[Hook], bool, bool]:
+    """
+    Keyset pagination over (user_id, id).
+    Returns (hooks in id order, has_prev, has_next). Pass after_id to go forward
+    from a page's last id, before_id to go back from a page's first id.
+    """
+    query = active_hooks_query(user_id, search)
+    backwards = before_id is not None
+    if backwards:
+        query = query.where(Hook.id < before_id).order_by(Hook.id.desc())
+    else:
+        if after_id is not None:
+            query = query.where(Hook.id > after_id)
+        query = query.order_by(Hook.id)
+    result = await session.execute(query.limit(limit + 1))
+    hooks = list(result.scalars().all())
+    has_more = len(hooks) > limit
+    hooks = hooks[:limit]
+    if backwards:
+        hooks.reverse()
+        return hooks, has_more, True
+    return hooks, after_id is not None, has_more
@@ -0,0 +1,228 @@
+import asyncio
+import os
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+
+from sqlalchemy import select, and_, or_, inspect
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.database.engine import AsyncSessionLocal
+from app.database.models import Hook
+
+# Flush pending diffs every N milliseconds or as soon as N diffs are queued
+HOOK_FLUSH_INTERVAL_MS = float(os.getenv('HOOK_FLUSH_INTERVAL_MS', '20'))
+HOOK_FLUSH_MAX_DIFFS = int(os.getenv('HOOK_FLUSH_MAX_DIFFS', '100'))
+
+
+@dataclass
+class HookOp:
+    """Single hook change: action is 'add', 'update' or 'delete'"""
+    action: str
+    text: str
+    new_text: str | None = None
+    expires_at: datetime | None = None
+
+
+@dataclass
+class HookDiff:
+    """All hook changes extracted from one message"""
+    user_id: int
+    ops: list[HookOp]
+    future: asyncio.Future | None = None
+
+
+def _is_active(expires_at: datetime | None) -> bool:
+    if expires_at is None:
+        return True
+    if expires_at.tzinfo is None:
+        expires_at = expires_at.replace(tzinfo=timezone.utc)
+    return expires_at > datetime.now(timezone.utc)
+
+
+async def apply_diffs(session: AsyncSession, diffs: list[HookDiff]) -> None:
+    """
+    Apply diffs in order inside the caller's transaction. Hooks referenced by
+    updates/deletes are loaded with one query, then changes are applied in memory
+    and written by a single flush on commit.
+    """
+    referenced: dict[int, set[str]] = {}
+    for diff in diffs:
+        for op in diff.ops:
+            if op.action != 'add':
+                referenced.setdefault(diff.user_id, set()).add(op.text)
+    index: dict[tuple[int, str], list[Hook]] = {}
+    if referenced:
+        result = await session.execute(
+            select(Hook)
+            .where(or_(*(
+                and_(Hook.user_id == user_id, Hook.text.in_(texts))
+                for user_id, texts in referenced.items()
+            )))
+            .order_by(Hook.id)
+        )
+        for hook in result.scalars().all():
+            index.setdefault((hook.user_id, hook.text), []).append(hook)
+    for diff in diffs:
+        for op in diff.ops:
+            if op.action == 'add':
+                hook = Hook(user_id=diff.user_id, text=op.text, expires_at=op.expires_at)
+                session.add(hook)
+                index.setdefault((diff.user_id, op.text), []).append(hook)
+                continue
+            hooks = index.get((diff.user_id, op.text))
+            if not hooks:
+                continue
+            hook = hooks.pop(0)
+            if op.action == 'update':
+                hook.text = op.new_text
+                hook.expires_at = op.expires_at
+                index.setdefault((diff.user_id, op.new_text), []).append(hook)
+            elif op.action == 'delete':
+                if inspect(hook).pending:
+                    session.expunge(hook)
+                else:
+                    await session.delete(hook)
+
+
+class HookWriteBuffer:
+    """
+    Write-behind buffer for hook changes. Diffs from all users are queued and
+    committed together in one transaction, so concurrent users do not fight
+    over SQLite's single writer. Diffs are applied in submission order, which
+    keeps each user's changes ordered. Until a diff is committed, readers see
+    it through overlay().
+    """
+
+    def __init__(
+        self,
+        session_factory: async_sessionmaker = AsyncSessionLocal,
+        flush_interval_ms: float = HOOK_FLUSH_INTERVAL_MS,
+        max_diffs: int = HOOK_FLUSH_MAX_DIFFS,
+    ):
+        self.session_factory = session_factory
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_diffs = max_diffs
+        self._pending: list[HookDiff] = []
+        self._flushing: list[HookDiff] = []
+        self._flush_lock = asyncio.Lock()
+        self._timer: asyncio.TimerHandle | None = None
+        self._flush_task: asyncio.Task | None = None
+        # Metrics
+        self.flushes = 0
+        self.diffs_written = 0
+
+    def submit(self, user_id: int, ops: list[HookOp]) -> asyncio.Future:
+        """Queue changes; the returned future resolves once they are committed"""
+        loop = asyncio.get_running_loop()
+        diff = HookDiff(user_id=user_id, ops=ops, future=loop.create_future())
+        # Errors are logged in flush; mark them retrieved for callers that do not wait
+        diff.future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._pending.append(diff)
+        if len(self._pending) >= self.max_diffs:
+            self._schedule_flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.flush_interval, self._schedule_flush)
+        return diff.future
+
+    def snapshot(self, user_id: int) -> list[HookDiff]:
+        """Uncommitted diffs of a user; take it before reading hooks from the database"""
+        return [diff for diff in self._flushing + self._pending if diff.user_id == user_id]
+
+    def overlay(self, user_id: int, texts: list[str], snapshot: list[HookDiff]) -> list[str]:
+        """
+        Apply uncommitted changes of a user to hook texts read from the database.
+        Diffs from the snapshot taken before the read are applied even if a flush
+        committed them meanwhile, plus diffs queued since; application is idempotent,
+        so diffs the read already saw are not applied twice.
+        """
+        seen = {id(diff) for diff in snapshot}
+        diffs = snapshot + [diff for diff in self.snapshot(user_id) if id(diff) not in seen]
+        texts = list(texts)
+        for diff in diffs:
+            for op in diff.ops:
+                if op.action == 'add':
+                    if op.text not in texts and _is_active(op.expires_at):
+                        texts.append(op.text)
+                elif op.text in texts:
+                    index = texts.index(op.text)
+                    if op.action == 'delete' or not _is_active(op.expires_at):
+                        del texts[index]
+                    elif op.new_text in texts:
+                        del texts[index]
+                    else:
+                        texts[index] = op.new_text
+        return texts
+
+    def pending_count(self) -> int:
+        return len(self._pending) + len(self._flushing)
+
+    def _schedule_flush(self) -> None:
+        """Start the background flush unless one is already running (it drains the queue itself)"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._flush_task is not None and not self._flush_task.done():
+            return
+        self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def _flush_loop(self) -> None:
+        while True:
+            await self.flush()
+            if len(self._pending) < self.max_diffs:
+                break
+        if self._pending and self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.flush_interval, self._schedule_flush)
+
+    async def flush(self) -> None:
+        """Commit everything queued so far in one transaction"""
+        async with self._flush_lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if not self._pending:
+                return
+            self._flushing, self._pending = self._pending, []
+            started = time.perf_counter()
+            try:
+                async with self.session_factory() as session:
+                    await apply_diffs(session, self._flushing)
+                    await session.commit()
+                for diff in self._flushing:
+                    if not diff.future.done():
+                        diff.future.set_result(None)
+                written = len(self._flushing)
+            except Exception as e:
+                print(f"❌ Batched hook flush failed ({e}), retrying diffs one by one")
+                written = await self._flush_one_by_one()
+            self.flushes += 1
+            self.diffs_written += written
+            users = len({diff.user_id for diff in self._flushing})
+            print(f"✅ Hooks flushed: {written}/{len(self._flushing)} diffs, {users} users, {(time.perf_counter() - started) * 1000:.1f} ms")
+            self._flushing = []
+
+    async def _flush_one_by_one(self) -> int:
+        """Isolate a bad diff so it does not drop the rest of the batch; returns diffs written"""
+        written = 0
+        for diff in self._flushing:
+            try:
+                async with self.session_factory() as session:
+                    await apply_diffs(session, [diff])
+                    await session.commit()
+                written += 1
+                if not diff.future.done():
+                    diff.future.set_result(None)
+            except Exception as e:
+                print(f"❌ Error writing hooks for user {diff.user_id}: {e}")
+                if not diff.future.done():
+                    diff.future.set_exception(e)
+        return written
+
+    async def stop(self) -> None:
+        """Flush everything that is still pending (called on shutdown)"""
+        if self._flush_task is not None:
+            await asyncio.gather(self._flush_task, return_exceptions=True)
+        await self.flush()
+
+
+hook_writer = HookWriteBuffer()
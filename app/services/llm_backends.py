@@ -0,0 +1,228 @@
+import asyncio
+import json
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Any
+
+import aiohttp
+
+from app.services.metrics import LatencyTracker
+
+
+@dataclass
+class FunctionCall:
+    """Backend-independent function call: name plus arguments mapping"""
+    name: str
+    args: Any
+
+
+@dataclass
+class LLMResult:
+    """Normalized model response"""
+    text: str | None
+    function_call: FunctionCall | None
+    backend: str
+    raw: Any = None
+
+
+# --- Backend Interface ---
+class LLMBackend(ABC):
+    """Base class for LLM backends; subclasses implement _generate"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.latency = LatencyTracker()
+
+    async def generate(self, prompt: str, temperature: float, use_tools: bool = True) -> LLMResult:
+        started = time.perf_counter()
+        result = await self._generate(prompt, temperature, use_tools)
+        self.latency.record(time.perf_counter() - started)
+        return result
+
+    @abstractmethod
+    async def _generate(self, prompt: str, temperature: float, use_tools: bool) -> LLMResult:
+        """Perform one model call"""
+
+    def backends(self) -> list["LLMBackend"]:
+        """Concrete backends behind this one (for latency reporting)"""
+        return [self]
+
+    async def close(self) -> None:
+        pass
+
+
+class GeminiBackend(LLMBackend):
+    """Backend over google.generativeai models (with and without tools)"""
+
+    def __init__(self, name: str, model, model_no_tools):
+        super().__init__(name)
+        self.model = model
+        self.model_no_tools = model_no_tools
+
+    async def _generate(self, prompt: str, temperature: float, use_tools: bool) -> LLMResult:
+        from google.generativeai.types import GenerationConfig
+
+        model = self.model if use_tools else self.model_no_tools
+        response = await model.generate_content_async(
+            prompt,
+            generation_config=GenerationConfig(temperature=temperature)
+        )
+        texts = []
+        function_call = None
+        if response.candidates:
+            for part in getattr(response.candidates[0].content, "parts", None) or []:
+                if getattr(part, "text", None):
+                    texts.append(part.text)
+                if function_call is None and getattr(part, "function_call", None):
+                    function_call = FunctionCall(name=part.function_call.name, args=part.function_call.args)
+        # Same as response.text: all text parts joined together
+        text = "".join(texts).strip() or None
+        raw = response.to_dict() if hasattr(response, 'to_dict') else str(response)
+        return LLMResult(text=text, function_call=function_call, backend=self.name, raw=raw)
+
+
+def _to_json_schema(schema):
+    """Convert Gemini-style schema (upper-case types) to JSON Schema"""
+    if isinstance(schema, dict):
+        return {
+            key: value.lower() if key == "type" and isinstance(value, str) else _to_json_schema(value)
+            for key, value in schema.items()
+        }
+    if isinstance(schema, list):
+        return [_to_json_schema(item) for item in schema]
+    return schema
+
+
+class OpenAICompatibleBackend(LLMBackend):
+    """Backend for any HTTP endpoint implementing the OpenAI /chat/completions API"""
+
+    def __init__(
+        self,
+        name: str,
+        base_url: str,
+        model_name: str,
+        api_key: str | None = None,
+        function_declarations: list[dict] | None = None,
+        timeout: float = 60.0,
+    ):
+        super().__init__(name)
+        self.url = base_url.rstrip('/') + "/chat/completions"
+        self.model_name = model_name
+        self.api_key = api_key
+        self.tools = [
+            {
+                "type": "function",
+                "function": {
+                    "name": declaration["name"],
+                    "description": declaration.get("description", ""),
+                    "parameters": _to_json_schema(declaration.get("parameters", {})),
+                },
+            }
+            for declaration in function_declarations or []
+        ]
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self._session: aiohttp.ClientSession | None = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            headers = {"Authorization": f"Bearer {self.api_key}"} if self.api_key else {}
+            self._session = aiohttp.ClientSession(headers=headers, timeout=self.timeout)
+        return self._session
+
+    async def _generate(self, prompt: str, temperature: float, use_tools: bool) -> LLMResult:
+        payload = {
+            "model": self.model_name,
+            "messages": [{"role": "user", "content": prompt}],
+            "temperature": temperature,
+        }
+        if use_tools and self.tools:
+            payload["tools"] = self.tools
+        async with self._get_session().post(self.url, json=payload) as response:
+            response.raise_for_status()
+            data = await response.json()
+        message = data["choices"][0]["message"]
+        text = (message.get("content") or "").strip() or None
+        function_call = None
+        for tool_call in message.get("tool_calls") or []:
+            function = tool_call.get("function", {})
+            arguments = function.get("arguments") or "{}"
+            function_call = FunctionCall(
+                name=function.get("name", ""),
+                args=json.loads(arguments) if isinstance(arguments, str) else arguments
+            )
+            break
+        return LLMResult(text=text, function_call=function_call, backend=self.name, raw=data)
+
+    async def close(self) -> None:
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+
+# --- Hedged Requests ---
+class HedgedBackend(LLMBackend):
+    """
+    Sends the request to the primary backend and, if it has not answered
+    within the primary's p95 latency, fires the same request at the backup.
+    The first successful answer wins and the other request is cancelled.
+    """
+
+    def __init__(
+        self,
+        primary: LLMBackend,
+        backup: LLMBackend,
+        default_delay: float = 2.0,
+        min_delay: float = 0.05,
+        min_samples: int = 20,
+    ):
+        super().__init__(f"hedged({primary.name}, {backup.name})")
+        self.primary = primary
+        self.backup = backup
+        self.default_delay = default_delay
+        self.min_delay = min_delay
+        self.min_samples = min_samples
+        self.hedges_fired = 0
+        self.backup_wins = 0
+
+    def hedge_delay(self) -> float:
+        """Delay before firing the backup: primary's p95, or default until enough samples"""
+        if len(self.primary.latency) < self.min_samples:
+            return self.default_delay
+        return max(self.min_delay, self.primary.latency.percentile(0.95))
+
+    async def _generate(self, prompt: str, temperature: float, use_tools: bool) -> LLMResult:
+        started = time.perf_counter()
+        primary_task = asyncio.ensure_future(self.primary.generate(prompt, temperature, use_tools))
+        pending = {primary_task}
+        try:
+            done, pending = await asyncio.wait(pending, timeout=self.hedge_delay())
+            if primary_task in done and primary_task.exception() is None:
+                return primary_task.result()
+            # Primary is slow or failed: fire the backup
+            self.hedges_fired += 1
+            backup_task = asyncio.ensure_future(self.backup.generate(prompt, temperature, use_tools))
+            pending.add(backup_task)
+            errors = [primary_task.exception()] if primary_task in done else []
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is backup_task:
+                            self.backup_wins += 1
+                        return task.result()
+                    errors.append(task.exception())
+            raise errors[-1]
+        finally:
+            for task in pending:
+                task.cancel()
+            if primary_task in pending:
+                # A cancelled primary never records its latency; without this lower-bound
+                # sample the slowest calls drop out and the p95 delay drifts down
+                self.primary.latency.record(time.perf_counter() - started)
+
+    def backends(self) -> list[LLMBackend]:
+        return self.primary.backends() + self.backup.backends()
+
+    async def close(self) -> None:
+        await self.primary.close()
+        await self.backup.close()
@@ -0,0 +1,23 @@
+from collections import deque
+
+
+# --- Latency Tracking ---
+class LatencyTracker:
+    """Sliding window of recent successful call latencies (seconds)"""
+
+    def __init__(self, window: int = 200):
+        self._samples: deque[float] = deque(maxlen=window)
+
+    def record(self, seconds: float) -> None:
+        self._samples.append(seconds)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def percentile(self, q: float) -> float | None:
+        """Nearest-rank percentile, q in [0, 1]; None when there are no samples"""
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, max(0, int(round(q * len(ordered))) - 1))
+        return ordered[index]
@@ -0,0 +1,130 @@
+import os
+from sqlalchemy import select, delete, func
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
+
+from app.database.models import BotPersonality, CurrentPersonality
+
+# How many personality versions to keep per user (older ones are pruned)
+PERSONALITY_HISTORY_LIMIT = max(1, int(os.getenv('PERSONALITY_HISTORY_LIMIT', '5')))
+
+# === In-process cache of active personalities: user_id -> prompt (None = no personality) ===
+_personality_cache: dict[int, str | None] = {}
+# Bumped on every write/invalidation, so a lookup that raced with one does not cache the old prompt
+_personality_generation: dict[int, int] = {}
+_cache_epoch = 0
+
+
+def _generation(user_id: int) -> tuple[int, int]:
+    return _cache_epoch, _personality_generation.get(user_id, 0)
+
+
+def _bump_generation(user_id: int) -> None:
+    _personality_generation[user_id] = _personality_generation.get(user_id, 0) + 1
+
+
+async def _load_bot_personality(session: AsyncSession, user_id: int) -> str | None:
+    """Read the active personality through the pointer, falling back to the latest version"""
+    current = await session.get(
+        CurrentPersonality,
+        user_id,
+        options=[joinedload(CurrentPersonality.personality)]
+    )
+    if current is not None:
+        return current.personality.personality_prompt if current.personality else None
+    # Users created before the pointer table existed: take the newest version
+    result = await session.execute(
+        select(BotPersonality)
+        .where(BotPersonality.user_id == user_id)
+        .order_by(BotPersonality.id.desc())
+        .limit(1)
+    )
+    personality = result.scalar_one_or_none()
+    return personality.personality_prompt if personality else None
+
+
+async def get_bot_personality(session: AsyncSession, user_id: int) -> str | None:
+    """Get current bot personality for a user (served from cache after the first lookup)"""
+    if user_id in _personality_cache:
+        return _personality_cache[user_id]
+    generation = _generation(user_id)
+    prompt = await _load_bot_personality(session, user_id)
+    if _generation(user_id) == generation:
+        _personality_cache[user_id] = prompt
+    return prompt
+
+
+async def _prune_personality_history(session: AsyncSession, user_id: int) -> None:
+    """Delete versions older than the last PERSONALITY_HISTORY_LIMIT ones"""
+    result = await session.execute(
+        select(BotPersonality.id)
+        .where(BotPersonality.user_id == user_id)
+        .order_by(BotPersonality.id.desc())
+        .offset(PERSONALITY_HISTORY_LIMIT - 1)
+        .limit(1)
+    )
+    oldest_kept_id = result.scalar_one_or_none()
+    if oldest_kept_id is not None:
+        await session.execute(
+            delete(BotPersonality)
+            .where(BotPersonality.user_id == user_id)
+            .where(BotPersonality.id < oldest_kept_id)
+        )
+
+
+async def set_bot_personality(session: AsyncSession, user_id: int, personality_prompt: str | None) -> None:
+    """Save a new personality version (None clears it), move the pointer and refresh the cache"""
+    personality_id = None
+    if personality_prompt is not None:
+        version = BotPersonality(user_id=user_id, personality_prompt=personality_prompt)
+        session.add(version)
+        await session.flush()
+        personality_id = version.id
+    # Atomic upsert: concurrent edits of one user must not both INSERT the pointer
+    upsert = sqlite_insert(CurrentPersonality).values(user_id=user_id, personality_id=personality_id)
+    await session.execute(upsert.on_conflict_do_update(
+        index_elements=[CurrentPersonality.user_id],
+        set_={"personality_id": upsert.excluded.personality_id, "updated_at": func.now()}
+    ))
+    await _prune_personality_history(session, user_id)
+    try:
+        await session.commit()
+    except Exception:
+        _bump_generation(user_id)
+        _personality_cache.pop(user_id, None)
+        raise
+    # After the commit: lookups started earlier may have read the old version
+    _bump_generation(user_id)
+    _personality_cache[user_id] = personality_prompt
+
+
+async def prune_all_personality_histories(session: AsyncSession) -> int:
+    """One pass over all users: keep only the last PERSONALITY_HISTORY_LIMIT versions each"""
+    ranked = select(
+        BotPersonality.id,
+        func.row_number().over(
+            partition_by=BotPersonality.user_id,
+            order_by=BotPersonality.id.desc()
+        ).label("version_rank")
+    ).subquery()
+    result = await session.execute(
+        delete(BotPersonality).where(
+            BotPersonality.id.in_(
+                select(ranked.c.id).where(ranked.c.version_rank > PERSONALITY_HISTORY_LIMIT)
+            )
+        )
+    )
+    await session.commit()
+    return result.rowcount
+
+
+def invalidate_personality_cache(user_id: int | None = None) -> None:
+    """Drop cached personality for one user, or for everyone"""
+    global _cache_epoch
+    if user_id is None:
+        _cache_epoch += 1
+        _personality_cache.clear()
+    else:
+        _bump_generation(user_id)
+        _personality_cache.pop(user_id, None)
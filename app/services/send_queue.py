@@ -0,0 +1,292 @@
+import asyncio
+import heapq
+import itertools
+import os
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable
+
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.types import Message
+
+from app.services.metrics import LatencyTracker
+from app.services.telegram_limits import TELEGRAM_MESSAGE_LIMIT
+
+# Send priorities: lower value goes first
+PRIORITY_COMMAND = 0
+PRIORITY_REPLY = 1
+
+# Telegram flood limits: ~30 msg/s per bot, ~1 msg/s per chat (short bursts allowed)
+GLOBAL_RATE = float(os.getenv('TELEGRAM_GLOBAL_RATE', '30'))
+CHAT_RATE = float(os.getenv('TELEGRAM_CHAT_RATE', '1'))
+CHAT_BURST = float(os.getenv('TELEGRAM_CHAT_BURST', '3'))
+MAX_IN_FLIGHT = 10
+MAX_RETRIES = 5
+
+
+# --- Helper Functions ---
+def split_text(text: str, limit: int = TELEGRAM_MESSAGE_LIMIT) -> list[str]:
+    """Split long text into chunks within the message limit, preferring paragraph/line/word breaks"""
+    chunks = []
+    while len(text) > limit:
+        cut = limit
+        for separator in ("\n\n", "\n", " "):
+            position = text.rfind(separator, 0, limit)
+            if position > limit // 2:
+                cut = position
+                break
+        chunks.append(text[:cut].rstrip())
+        text = text[cut:].lstrip()
+    if text or not chunks:
+        chunks.append(text)
+    return chunks
+
+
+class TokenBucket:
+    """Token bucket that can also be blocked until a moment (after RetryAfter)"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self, now: float) -> None:
+        # now may be taken before the bucket was created; never refill backwards
+        self.tokens = min(self.capacity, self.tokens + max(0.0, now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now: float) -> float:
+        """Seconds until one token is available"""
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def consume(self, now: float) -> None:
+        self._refill(now)
+        self.tokens -= 1
+
+    def block(self, until: float) -> None:
+        self.blocked_until = max(self.blocked_until, until)
+        self.tokens = 0
+
+    def is_idle(self, now: float) -> bool:
+        return now >= self.blocked_until and self.wait_time(now) == 0 and self.tokens >= self.capacity
+
+
+@dataclass
+class SendJob:
+    chat_id: int
+    send: Callable[[], Awaitable[Any]]
+    priority: int
+    future: asyncio.Future
+    enqueued_at: float = field(default_factory=time.monotonic)
+    attempts: int = 0
+
+
+# --- Outbound Dispatcher ---
+class OutboundDispatcher:
+    """
+    Single outbound queue for all Telegram sends. Each chat has a FIFO queue and
+    only its head is scheduled, so split replies keep their order; heads of
+    different chats are taken by priority, paced by a global and a per-chat
+    token bucket, and rescheduled on RetryAfter instead of failing the handler.
+    """
+
+    def __init__(
+        self,
+        global_rate: float = GLOBAL_RATE,
+        chat_rate: float = CHAT_RATE,
+        chat_burst: float = CHAT_BURST,
+        max_in_flight: int = MAX_IN_FLIGHT,
+    ):
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.chat_buckets: dict[int, TokenBucket] = {}
+        self._ready: list[tuple[int, int, SendJob]] = []
+        self._delayed: list[tuple[float, int, SendJob]] = []
+        self._seq = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._in_flight: set[asyncio.Task] = set()
+        # Per-chat FIFO; the head is in _ready, _delayed or in flight
+        self._chat_queues: dict[int, deque[SendJob]] = {}
+        self._slots = asyncio.Semaphore(max_in_flight)
+        self._worker: asyncio.Task | None = None
+        # Metrics
+        self.queue_latency = LatencyTracker()
+        self.send_latency = LatencyTracker()
+        self.sent = 0
+        self.failed = 0
+        self.retry_after_count = 0
+
+    def start(self) -> None:
+        if self._worker is None:
+            self._worker = asyncio.create_task(self._run())
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        """Drain queued messages (up to timeout) and stop the worker"""
+        deadline = time.monotonic() + timeout
+        while self.queue_depth() and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        if self._worker is not None:
+            self._worker.cancel()
+            self._worker = None
+        if self._in_flight:
+            await asyncio.wait(self._in_flight, timeout=max(0.0, deadline - time.monotonic()))
+
+    def queue_depth(self) -> int:
+        return sum(len(queue) for queue in self._chat_queues.values())
+
+    def metrics(self) -> dict[str, Any]:
+        return {
+            "queue_depth": self.queue_depth(),
+            "in_flight": len(self._in_flight),
+            "sent": self.sent,
+            "failed": self.failed,
+            "retry_after": self.retry_after_count,
+            "queue_p95": self.queue_latency.percentile(0.95),
+            "send_p95": self.send_latency.percentile(0.95),
+        }
+
+    def submit(self, chat_id: int, send: Callable[[], Awaitable[Any]], priority: int = PRIORITY_REPLY) -> asyncio.Future:
+        """Enqueue a send; the returned future resolves with the API call result"""
+        job = SendJob(chat_id=chat_id, send=send, priority=priority, future=asyncio.get_running_loop().create_future())
+        queue = self._chat_queues.get(chat_id)
+        if queue:
+            queue.append(job)
+        else:
+            self._chat_queues[chat_id] = deque([job])
+            self._push_ready(job)
+        return job.future
+
+    def _push_ready(self, job: SendJob) -> None:
+        heapq.heappush(self._ready, (job.priority, next(self._seq), job))
+        self._wakeup.set()
+
+    def _push_delayed(self, job: SendJob, not_before: float) -> None:
+        heapq.heappush(self._delayed, (not_before, next(self._seq), job))
+        self._wakeup.set()
+
+    def _advance(self, chat_id: int) -> None:
+        """Drop the chat's finished head and schedule the next job of that chat"""
+        queue = self._chat_queues[chat_id]
+        queue.popleft()
+        if queue:
+            self._push_ready(queue[0])
+        else:
+            del self._chat_queues[chat_id]
+
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self.chat_buckets.get(chat_id)
+        if bucket is None:
+            if len(self.chat_buckets) > 10000:
+                now = time.monotonic()
+                self.chat_buckets = {cid: b for cid, b in self.chat_buckets.items() if not b.is_idle(now)}
+            bucket = self.chat_buckets[chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+        return bucket
+
+    async def _wait(self, timeout: float | None) -> None:
+        self._wakeup.clear()
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _run(self) -> None:
+        while True:
+            now = time.monotonic()
+            while self._delayed and self._delayed[0][0] <= now:
+                _, _, job = heapq.heappop(self._delayed)
+                heapq.heappush(self._ready, (job.priority, next(self._seq), job))
+            if not self._ready:
+                await self._wait(self._delayed[0][0] - now if self._delayed else None)
+                continue
+            global_wait = self.global_bucket.wait_time(now)
+            if global_wait > 0:
+                await asyncio.sleep(global_wait)
+                continue
+            _, _, job = heapq.heappop(self._ready)
+            if job.future.done():
+                self._advance(job.chat_id)
+                continue
+            chat_bucket = self._chat_bucket(job.chat_id)
+            chat_wait = chat_bucket.wait_time(now)
+            if chat_wait > 0:
+                # Other chats keep going while this one waits for its bucket
+                self._push_delayed(job, now + chat_wait)
+                continue
+            await self._slots.acquire()
+            now = time.monotonic()
+            self.global_bucket.consume(now)
+            chat_bucket.consume(now)
+            task = asyncio.create_task(self._send(job))
+            self._in_flight.add(task)
+            task.add_done_callback(self._in_flight.discard)
+
+    async def _send(self, job: SendJob) -> None:
+        started = time.monotonic()
+        retrying = False
+        try:
+            job.attempts += 1
+            result = await job.send()
+        except TelegramRetryAfter as e:
+            self.retry_after_count += 1
+            if job.attempts >= MAX_RETRIES:
+                self.failed += 1
+                if not job.future.done():
+                    job.future.set_exception(e)
+                return
+            retry_at = time.monotonic() + e.retry_after
+            self._chat_bucket(job.chat_id).block(retry_at)
+            print(f"⏳ RetryAfter {e.retry_after}s для чата {job.chat_id}, повтор #{job.attempts}")
+            self._push_delayed(job, retry_at)
+            retrying = True
+        except Exception as e:
+            self.failed += 1
+            if not job.future.done():
+                job.future.set_exception(e)
+        else:
+            finished = time.monotonic()
+            self.sent += 1
+            self.send_latency.record(finished - started)
+            self.queue_latency.record(finished - job.enqueued_at)
+            if not job.future.done():
+                job.future.set_result(result)
+        finally:
+            self._slots.release()
+            # A retried job stays the head of its chat
+            if not retrying:
+                self._advance(job.chat_id)
+
+
+outbound = OutboundDispatcher()
+
+
+# --- Send Helpers for Handlers ---
+async def send_message(message: Message, text: str, priority: int = PRIORITY_COMMAND, **kwargs) -> Message:
+    """Answer a message through the outbound queue, splitting long text; reply_markup goes on the last part"""
+    parts = split_text(text)
+    reply_markup = kwargs.pop("reply_markup", None)
+    futures = []
+    for index, part in enumerate(parts):
+        markup = reply_markup if index == len(parts) - 1 else None
+        futures.append(outbound.submit(
+            message.chat.id,
+            lambda part=part, markup=markup: message.answer(part, reply_markup=markup, **kwargs),
+            priority
+        ))
+    results = await asyncio.gather(*futures)
+    return results[-1]
+
+
+async def edit_message(message: Message, text: str, priority: int = PRIORITY_COMMAND, **kwargs):
+    """Edit a message through the outbound queue (text is cut to the message limit)"""
+    return await outbound.submit(
+        message.chat.id,
+        lambda: message.edit_text(text[:TELEGRAM_MESSAGE_LIMIT], **kwargs),
+        priority
+    )
@@ -0,0 +1,4 @@
+# Telegram Bot API limits shared by handlers and the outbound queue
+
+# Maximum length of a text message
+TELEGRAM_MESSAGE_LIMIT = 4096
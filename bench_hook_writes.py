@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Telegram Bot Memory - Hook Write Benchmark
+Сравнение записи хуков: коммит на каждое сообщение против write-behind буфера
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+# Добавляем корневую папку в путь для импортов
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+
+from app.database.models import Base, User
+from app.services.hook_writer import HookWriteBuffer, HookDiff, HookOp, apply_diffs
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Бенчмарк записи хуков в SQLite")
+    parser.add_argument("--users", type=int, default=50, help="Число одновременных пользователей")
+    parser.add_argument("--messages", type=int, default=40, help="Сообщений на пользователя")
+    parser.add_argument("--hooks-per-message", type=int, default=3)
+    parser.add_argument("--flush-interval-ms", type=float, default=20.0)
+    parser.add_argument("--max-diffs", type=int, default=100)
+    return parser.parse_args()
+
+
+def message_ops(args, user_id: int, index: int) -> list[HookOp]:
+    ops = [HookOp('add', f"Факт {index}.{n} пользователя {user_id}") for n in range(args.hooks_per_message)]
+    if index > 0:
+        ops.append(HookOp('update', f"Факт {index - 1}.0 пользователя {user_id}", f"Обновлённый факт {index - 1}.0 пользователя {user_id}"))
+    return ops
+
+
+async def prepare(path: str, users: int) -> tuple:
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    session_factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    async with session_factory() as session:
+        session.add_all([User(user_id=user_id, first_name=f"user{user_id}") for user_id in range(users)])
+        await session.commit()
+    return engine, session_factory
+
+
+async def run_per_message(args, session_factory) -> int:
+    """Current behaviour: every message commits its own transaction"""
+    errors = 0
+
+    async def user_loop(user_id: int):
+        nonlocal errors
+        for index in range(args.messages):
+            try:
+                async with session_factory() as session:
+                    await apply_diffs(session, [HookDiff(user_id, message_ops(args, user_id, index))])
+                    await session.commit()
+            except Exception:
+                errors += 1
+
+    await asyncio.gather(*(user_loop(user_id) for user_id in range(args.users)))
+    return errors
+
+
+async def run_write_behind(args, session_factory) -> int:
+    """Write-behind: diffs of all users are committed in shared transactions"""
+    errors = 0
+    writer = HookWriteBuffer(session_factory, args.flush_interval_ms, args.max_diffs)
+
+    async def user_loop(user_id: int):
+        nonlocal errors
+        for index in range(args.messages):
+            try:
+                await writer.submit(user_id, message_ops(args, user_id, index))
+            except Exception:
+                errors += 1
+
+    await asyncio.gather(*(user_loop(user_id) for user_id in range(args.users)))
+    await writer.stop()
+    print(f"   транзакций: {writer.flushes}")
+    return errors
+
+
+async def main(args):
+    messages = args.users * args.messages
+    for name, runner in (("коммит на сообщение", run_per_message), ("write-behind буфер", run_write_behind)):
+        with tempfile.TemporaryDirectory() as tmp:
+            engine, session_factory = await prepare(os.path.join(tmp, "bench.db"), args.users)
+            print(f"⏱️  {name}: {args.users} пользователей × {args.messages} сообщений")
+            started = time.perf_counter()
+            errors = await runner(args, session_factory)
+            elapsed = time.perf_counter() - started
+            await engine.dispose()
+        print(f"   {messages / elapsed:.0f} сообщений/с, {messages * args.hooks_per_message / elapsed:.0f} хуков/с, ошибок: {errors}, время: {elapsed:.2f} с")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
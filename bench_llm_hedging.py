@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Telegram Bot Memory - LLM Hedging Benchmark
+Сравнение задержек: один бэкенд против хеджированных запросов к двум локальным заглушкам
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+# Добавляем корневую папку в путь для импортов
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from aiohttp import web
+
+from fake_llm_server import create_app
+from app.services.llm_backends import OpenAICompatibleBackend, HedgedBackend
+from app.services.metrics import LatencyTracker
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Бенчмарк хеджированных LLM-запросов на локальных заглушках")
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    parser.add_argument("--tail-prob", type=float, default=0.05)
+    parser.add_argument("--tail-ms", type=float, default=1000.0)
+    parser.add_argument("--port", type=int, default=8089, help="Порт первой заглушки (вторая — port + 1)")
+    return parser.parse_args()
+
+
+async def start_server(args, port: int, seed: int) -> web.AppRunner:
+    server_args = argparse.Namespace(
+        latency_ms=args.latency_ms, jitter=0.3, tail_prob=args.tail_prob,
+        tail_ms=args.tail_ms, error_rate=0.0, seed=seed
+    )
+    runner = web.AppRunner(create_app(server_args))
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", port).start()
+    return runner
+
+
+async def measure(backend, args) -> LatencyTracker:
+    latencies = LatencyTracker(window=args.requests)
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def one(index: int):
+        async with semaphore:
+            started = time.perf_counter()
+            await backend.generate(f"Сообщение пользователя: тест {index}", temperature=0.3)
+            latencies.record(time.perf_counter() - started)
+
+    await asyncio.gather(*(one(index) for index in range(args.requests)))
+    return latencies
+
+
+def report(name: str, latencies: LatencyTracker) -> None:
+    p50, p95, p99 = (latencies.percentile(q) * 1000 for q in (0.5, 0.95, 0.99))
+    print(f"   {name}: p50 {p50:.0f} мс, p95 {p95:.0f} мс, p99 {p99:.0f} мс")
+
+
+async def main(args):
+    runners = [await start_server(args, args.port, 1), await start_server(args, args.port + 1, 2)]
+    try:
+        def backend(name: str, port: int) -> OpenAICompatibleBackend:
+            return OpenAICompatibleBackend(name, f"http://127.0.0.1:{port}/v1", "fake", timeout=30)
+
+        print(f"⏱️  {args.requests} запросов, медиана {args.latency_ms} мс, хвост {args.tail_prob:.0%} × {args.tail_ms} мс")
+        single = backend("primary", args.port)
+        report("один бэкенд", await measure(single, args))
+        await single.close()
+
+        hedged = HedgedBackend(backend("primary", args.port), backend("backup", args.port + 1), default_delay=args.latency_ms * 3 / 1000)
+        report("хеджирование", await measure(hedged, args))
+        print(f"   резервных запросов: {hedged.hedges_fired}, побед резервного: {hedged.backup_wins}")
+        await hedged.close()
+    finally:
+        for runner in runners:
+            await runner.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Telegram Bot Memory - Fake LLM Server
+Локальная заглушка OpenAI-совместимого API для бенчмарков и тестов
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+
+from aiohttp import web
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Локальный OpenAI-совместимый сервер с настраиваемой задержкой")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency-ms", type=float, default=200.0, help="Медианная задержка ответа")
+    parser.add_argument("--jitter", type=float, default=0.3, help="Разброс задержки (sigma логнормального распределения)")
+    parser.add_argument("--tail-prob", type=float, default=0.05, help="Доля медленных ответов")
+    parser.add_argument("--tail-ms", type=float, default=3000.0, help="Задержка медленных ответов")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Доля ответов с ошибкой 500")
+    parser.add_argument("--seed", type=int, default=None)
+    return parser.parse_args()
+
+
+def sample_delay(args, rng: random.Random) -> float:
+    """Lognormal latency around the median with an occasional slow tail (seconds)"""
+    if rng.random() < args.tail_prob:
+        return args.tail_ms / 1000
+    return args.latency_ms / 1000 * rng.lognormvariate(0, args.jitter)
+
+
+def build_reply(payload: dict) -> dict:
+    """Echo the user message as text and, if tools are offered, as a hook to add"""
+    prompt = payload["messages"][-1]["content"]
+    user_text = prompt.rsplit(": ", 1)[-1].strip()
+    message = {"role": "assistant", "content": f"Эхо: {user_text}"}
+    if payload.get("tools"):
+        tool = payload["tools"][0]["function"]["name"]
+        message["tool_calls"] = [{
+            "id": "call_0",
+            "type": "function",
+            "function": {
+                "name": tool,
+                "arguments": json.dumps({"hooks_to_add": [{"text": f"Пользователь написал: {user_text[:100]}"}]}, ensure_ascii=False),
+            },
+        }]
+    return {
+        "id": f"fake-{time.time_ns()}",
+        "object": "chat.completion",
+        "model": payload.get("model", "fake"),
+        "choices": [{"index": 0, "message": message, "finish_reason": "stop"}],
+    }
+
+
+def create_app(args) -> web.Application:
+    rng = random.Random(args.seed)
+    stats = {"requests": 0, "errors": 0}
+
+    async def chat_completions(request: web.Request) -> web.Response:
+        payload = await request.json()
+        stats["requests"] += 1
+        await asyncio.sleep(sample_delay(args, rng))
+        if rng.random() < args.error_rate:
+            stats["errors"] += 1
+            return web.json_response({"error": {"message": "fake failure"}}, status=500)
+        return web.json_response(build_reply(payload))
+
+    async def health(request: web.Request) -> web.Response:
+        return web.json_response({"status": "ok", **stats})
+
+    app = web.Application()
+    app.router.add_post("/v1/chat/completions", chat_completions)
+    app.router.add_get("/health", health)
+    return app
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    print(f"🧪 Fake LLM server: http://{args.host}:{args.port}/v1 (медиана {args.latency_ms} мс, хвост {args.tail_prob:.0%} × {args.tail_ms} мс)")
+    web.run_app(create_app(args), host=args.host, port=args.port, print=None)
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Telegram Bot Memory - Export/Import CLI
+Потоковая выгрузка и загрузка памяти бота (пользователи, хуки, личности) в JSONL
+"""
+
+import argparse
+import asyncio
+import sys
+import os
+
+# Добавляем корневую папку в путь для импортов
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.database.transfer import export_memory, import_memory, DEFAULT_CHUNK_SIZE
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Экспорт/импорт памяти бота в JSONL (.jsonl.gz — со сжатием)")
+    parser.add_argument("command", choices=["export", "import"], help="Направление переноса")
+    parser.add_argument("path", help="Путь к файлу JSONL (например, memory.jsonl.gz)")
+    parser.add_argument("--database-url", default=None, help="URL базы данных SQLAlchemy (по умолчанию — база бота)")
+    parser.add_argument("--user-id", type=int, action="append", dest="user_ids", help="Переносить только этого пользователя (можно указать несколько раз)")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="Размер пакета строк")
+    parser.add_argument("--resume", action="store_true", help="Продолжить прерванный перенос с последней контрольной точки")
+    return parser.parse_args()
+
+
+async def run(args):
+    action = export_memory if args.command == "export" else import_memory
+    counts = await action(
+        args.path,
+        database_url=args.database_url,
+        user_ids=args.user_ids,
+        chunk_size=args.chunk_size,
+        resume=args.resume,
+    )
+    summary = ", ".join(f"{kind}: {count}" for kind, count in counts.items())
+    print(f"✅ Готово ({args.command}): {summary}")
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(run(parse_args()))
+    except KeyboardInterrupt:
+        print("\n⏹️  Перенос прерван, продолжите с флагом --resume")
+    except Exception as e:
+        print(f"❌ Ошибка переноса: {e}")
+        sys.exit(1)
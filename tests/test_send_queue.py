@@ -0,0 +1,45 @@
+import asyncio
+import random
+import time
+
+import pytest
+
+from app.services.send_queue import OutboundDispatcher, TokenBucket
+
+
+async def _send_parts(dispatcher: OutboundDispatcher, chats: int, parts: int) -> dict[int, list[int]]:
+    delivered: dict[int, list[int]] = {chat_id: [] for chat_id in range(chats)}
+
+    def job(chat_id: int, index: int):
+        async def send():
+            await asyncio.sleep(random.uniform(0, 0.003))
+            delivered[chat_id].append(index)
+        return send
+
+    dispatcher.start()
+    try:
+        futures = [
+            dispatcher.submit(chat_id, job(chat_id, index))
+            for chat_id in range(chats)
+            for index in range(parts)
+        ]
+        await asyncio.wait_for(asyncio.gather(*futures), timeout=10)
+    finally:
+        await dispatcher.stop(timeout=0)
+    return delivered
+
+
+@pytest.mark.parametrize("chat_burst", [1, 3])
+def test_parts_of_a_chat_keep_order_under_bucket_pressure(chat_burst):
+    random.seed(chat_burst)
+    for _ in range(5):
+        dispatcher = OutboundDispatcher(global_rate=1000, chat_rate=200, chat_burst=chat_burst)
+        delivered = asyncio.run(_send_parts(dispatcher, chats=4, parts=10))
+        assert delivered == {chat_id: list(range(10)) for chat_id in range(4)}
+
+
+def test_token_bucket_does_not_refill_backwards():
+    now = time.monotonic()
+    bucket = TokenBucket(rate=1, capacity=1)
+    # now was taken before the bucket existed
+    assert bucket.wait_time(now) == 0.0